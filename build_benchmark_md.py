@@ -5,15 +5,28 @@ It searches for recursively for all results in a root directory, computes the tr
 And display writes the `nhcd_benchmark.md` files which contains the table aggregating all the results.
 
 If many trajectories need to be evaluated, this script can take a long time.
+The trajectory errors are saved in a `kitti_metrics.yaml` file next to the poses of each sequence, and are only
+recomputed when the poses files are modified (or with `recompute=True`).
 """
 
+import io
 import sys
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
 
 import hydra
+import yaml
 from hydra.core.config_store import ConfigStore
 
+try:
+    # libyaml backed loader (much faster than the pure python loader)
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 from slam.common.io import *
 from slam.eval.eval_odometry import *
 
@@ -23,11 +36,19 @@ class BenchmarkBuilderConfig:
     root_dir: str = "."
     dataset: str = "kitti"
     output_dir: str = ".benchmark"
+    num_workers: Optional[int] = None  # The number of processes computing the metrics (os.cpu_count() by default)
+    recompute: bool = False  # Whether to recompute the trajectory errors saved in the `kitti_metrics.yaml` files
 
 
 cs = ConfigStore.instance()
 cs.store(name="benchmark", node=BenchmarkBuilderConfig)
 
+# The trajectory errors saved in the `kitti_metrics.yaml` files are reused only if they were computed with the same
+# version and segment lengths (`KITTI_SEGMENTS` of `slam.eval.eval_odometry`). Bump the version when the computation (`compute_kitti_metrics`, `read_poses_from_disk`)
+# changes
+KITTI_METRICS_FILE = "kitti_metrics.yaml"
+KITTI_METRICS_VERSION = 1
+
 
 def load_dataset(dataset: str) -> tuple:
     _datasets = ["kitti", "nhcd", "ford_campus", "nclt", "kitti_360", "ct_icp_kitti", "ct_icp_kitti_carla"]
@@ -49,6 +70,145 @@ def load_dataset(dataset: str) -> tuple:
         return "KITTI_CARLA", [f"Town{i + 1:02}" for i in range(7)]
 
 
+def iter_result_dirs(root_dir: str, folder_set: frozenset) -> Iterator[str]:
+    """Iterates over the directories under `root_dir` which contain at least one sequence folder of `folder_set`
+
+    The search is iterative (explicit stack), reads each directory only once with `os.scandir`,
+    and does not descend into a results directory once it has been identified.
+    As with `os.walk`, a symlink to a sequence folder is a sequence folder (and `root_dir` may be a symlink),
+    but the search never descends into a symlinked sub directory.
+    """
+    stack = deque([root_dir])
+    while stack:
+        current_dir = stack.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                # Same classification as the dir names of os.walk (symlinks to directories included)
+                sub_dirs = [entry for entry in it if entry.is_dir()]
+        except OSError:
+            continue
+
+        if folder_set.intersection(entry.name for entry in sub_dirs):
+            yield current_dir
+            continue
+
+        stack.extend(entry.path for entry in sub_dirs if not entry.is_symlink())
+
+
+def sequence_files(sequence_name: str) -> Tuple[str, str, str]:
+    """Returns the sequence name and the file names of its poses and ground truth poses"""
+    return sequence_name, f"{sequence_name}.poses.txt", f"{sequence_name}_gt.poses.txt"
+
+
+def _load_kitti_metrics(file_path: str) -> Optional[dict]:
+    """Loads the trajectory errors saved at `file_path` (None if they cannot be read, or are incomplete)"""
+    try:
+        with open(file_path, "r") as stream:
+            kitti_metrics = yaml.load(stream, Loader=_YamlLoader)
+    except (OSError, yaml.YAMLError):
+        return None
+    if not isinstance(kitti_metrics, dict):
+        return None
+    for field in ["tr_err", "rot_err", "segments_tr_err_sum", "num_segments"]:
+        value = kitti_metrics.get(field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+    return kitti_metrics
+
+
+def _save_kitti_metrics(file_path: str, kitti_metrics: dict):
+    """Saves the trajectory errors at `file_path`, atomically (through a temporary file and `os.replace`)"""
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as stream:
+            yaml.safe_dump(kitti_metrics, stream)
+        os.replace(tmp_path, file_path)
+    except OSError:
+        print(f"[WARNING]Could not save the trajectory errors at {file_path}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _compute_sequence_metrics(new_dir: str, seq_files: Tuple[str, str, str],
+                              recompute: bool = False) -> Tuple[str, str, Optional[dict]]:
+    """Computes the trajectory error of a sequence in a results directory
+
+    The errors are saved in the sequence directory in `KITTI_METRICS_FILE`, along with the modification times of the
+    poses files, `KITTI_METRICS_VERSION` and `KITTI_SEGMENTS`. They are reused as long as none of them change.
+
+    Args:
+        new_dir (str): The results directory
+        seq_files (tuple): The sequence name and file names returned by `sequence_files`
+        recompute (bool): Whether to ignore the saved errors
+
+    Returns `(new_dir, sequence_name, None)` if the poses or the ground truth poses are missing
+    """
+    sequence_name, poses_name, gt_poses_name = seq_files
+    sequence_path = os.path.join(new_dir, sequence_name)
+
+    # List the sequence directory once, instead of probing each file
+    try:
+        with os.scandir(sequence_path) as it:
+            entries = {entry.name: entry for entry in it if entry.is_file()}
+    except OSError:
+        return new_dir, sequence_name, None
+
+    poses_entry = entries.get(poses_name)
+    gt_poses_entry = entries.get(gt_poses_name)
+    if poses_entry is None or gt_poses_entry is None:
+        return new_dir, sequence_name, None
+
+    # Try to read the configuration files and metrics
+    time_ms = -1.0
+    if "metrics.yaml" in entries:
+        with open(entries["metrics.yaml"].path, "r") as stream:
+            metrics_dict = yaml.load(stream, Loader=_YamlLoader) or {}
+            seq_metrics_dict = metrics_dict.get(sequence_name) or {}
+            if "nsecs_per_frame" in seq_metrics_dict:
+                time_ms = float(seq_metrics_dict["nsecs_per_frame"]) * 1000.0
+
+    cache_key = {
+        "version": KITTI_METRICS_VERSION,
+        "segments": KITTI_SEGMENTS,
+        "poses_mtime_ns": poses_entry.stat().st_mtime_ns,
+        "gt_poses_mtime_ns": gt_poses_entry.stat().st_mtime_ns
+    }
+    kitti_metrics = None
+    if not recompute and KITTI_METRICS_FILE in entries:
+        kitti_metrics = _load_kitti_metrics(entries[KITTI_METRICS_FILE].path)
+        if kitti_metrics is not None and kitti_metrics.get("key") != cache_key:
+            kitti_metrics = None
+
+    if kitti_metrics is None:
+        print(f"[INFO]Computing trajectory error for sequence {sequence_name} at {new_dir}")
+        # Can compute metrics on both files
+        gt_poses = read_poses_from_disk(gt_poses_entry.path)
+        poses = read_poses_from_disk(poses_entry.path)
+        tr_err, rot_err, errors = compute_kitti_metrics(poses, gt_poses, KITTI_SEGMENTS)
+
+        kitti_metrics = {
+            "key": cache_key,
+            "tr_err": float(tr_err),
+            "rot_err": float(rot_err),
+            "segments_tr_err_sum": float(sum(error["tr_err"][0] for error in errors)),
+            "num_segments": len(errors)
+        }
+        # Save the errors for the next benchmarks
+        _save_kitti_metrics(os.path.join(sequence_path, KITTI_METRICS_FILE), kitti_metrics)
+
+    return new_dir, sequence_name, {
+        "tr_err": kitti_metrics["tr_err"],
+        "rot_err": kitti_metrics["rot_err"],
+        "segments_tr_err_sum": kitti_metrics["segments_tr_err_sum"],
+        "num_segments": kitti_metrics["num_segments"],
+        "average_time": time_ms
+    }
+
+
+def _compute_sequence_metrics_star(task: Tuple[str, Tuple[str, str, str], bool]):
+    return _compute_sequence_metrics(*task)
+
+
 @hydra.main(config_path=None, config_name="benchmark")
 def build_benchmark(cfg: BenchmarkBuilderConfig) -> None:
     """Builds the benchmark"""
@@ -59,131 +219,104 @@ def build_benchmark(cfg: BenchmarkBuilderConfig) -> None:
     dataset_name, folder_names = load_dataset(dataset)
 
     metrics = {}  # map root_path -> computed metrics
-    # Recursively search all child directories for folder with the appropriate name
-    directory_list = [x[0] for x in os.walk(root_dir)]  # Absolute paths
+    folder_set = frozenset(folder_names)
 
     output_root = Path(cfg.output_dir)
     if not output_root.exists():
         output_root.mkdir()
 
-    for new_dir in directory_list:
-
-        is_metrics_dir = False
+    # Recursively search all child directories for folder with the appropriate name
+    result_dirs = list(iter_result_dirs(root_dir, folder_set))
+    dirs_metrics = {new_dir: {} for new_dir in result_dirs}
+    # Running sums of the segments translation errors, number of segments and average times of each directory
+    dirs_sums = {new_dir: [0.0, 0, 0.0] for new_dir in result_dirs}
+
+    # Each (results directory, sequence) pair is evaluated independently
+    all_sequence_files = [sequence_files(sequence_name) for sequence_name in folder_names]
+    tasks = [(new_dir, seq_files, cfg.recompute) for new_dir in result_dirs for seq_files in all_sequence_files]
+    with ProcessPoolExecutor(max_workers=cfg.num_workers) as executor:
+        for new_dir, sequence_name, seq_metrics in executor.map(_compute_sequence_metrics_star, tasks, chunksize=8):
+            if seq_metrics is not None:
+                sums = dirs_sums[new_dir]
+                sums[0] += seq_metrics.pop("segments_tr_err_sum")
+                sums[1] += seq_metrics.pop("num_segments")
+                sums[2] += seq_metrics["average_time"]
+                dirs_metrics[new_dir][sequence_name] = seq_metrics
+
+    for new_dir, new_metrics in dirs_metrics.items():
         new_dir_path = Path(new_dir)
-        for folder in folder_names:
-            if (new_dir_path / folder).exists():
-                is_metrics_dir = True
-
-        if is_metrics_dir:
-            # New entry found compute and add the metrics for each sequence
-            new_metrics = {}
-            has_all_sequences = True
-            for sequence_name in folder_names:
-                sequence_path = new_dir_path / sequence_name
-
-                poses_file = sequence_path / f"{sequence_name}.poses.txt"
-                gt_poses_file = sequence_path / f"{sequence_name}_gt.poses.txt"
-                if poses_file.exists() and gt_poses_file.exists():
-                    if not new_metrics:
-                        print(f"[INFO]Found a results directory at {new_dir}")
-
-                    print(f"[INFO]Computing trajectory error for sequence {sequence_name}")
-                    # Can compute metrics on both files
-                    gt_poses = read_poses_from_disk(gt_poses_file)
-                    poses = read_poses_from_disk(poses_file)
-
-                    # Try to read the configuration files and metrics
-                    metrics_yaml = sequence_path / "metrics.yaml"
-                    time_ms = -1.0
-                    if metrics_yaml.exists():
-                        with open(str(metrics_yaml), "r") as stream:
-                            metrics_dict = yaml.safe_load(stream)
-                            if sequence_name in metrics_dict and "nsecs_per_frame" in metrics_dict[sequence_name]:
-                                time_ms = float(metrics_dict[sequence_name]["nsecs_per_frame"]) * 1000.0
-
-                    tr_err, rot_err, errors = compute_kitti_metrics(poses, gt_poses)
-
-                    new_metrics[sequence_name] = {
-                        "tr_err": tr_err,
-                        "rot_err": rot_err,
-                        "errors": errors,
-                        "average_time": time_ms
-                    }
-                else:
-                    has_all_sequences = False
-
-            if new_metrics:
-                if has_all_sequences:
-                    # Compute the average errors
-                    _errors = []
-                    for seq_metrics in new_metrics.values():
-                        _errors += seq_metrics["errors"]
-                        seq_metrics.pop("errors")
-                    avg_tr_err = sum([error["tr_err"][0] for error in _errors]) / len(_errors)
-                    new_metrics["AVG_tr_err"] = avg_tr_err * 100
-                    new_metrics["AVG_time"] = sum([new_metrics[seq]["average_time"] for seq in folder_names]) / len(
-                        folder_names)
-                else:
-                    new_metrics["AVG_tr_err"] = -1.0
-                    new_metrics["AVG_time"] = -1.0
-
-                # Try to read the config to find a git_hash
-                config_path = new_dir_path / "config.yaml"
-                if config_path.exists():
-                    with open(str(config_path), "r") as stream:
-                        config_dict = yaml.safe_load(stream)
-                        if "git_hash" in config_dict:
-                            new_metrics["git_hash"] = config_dict["git_hash"]
-
-                new_metrics["has_all_sequences"] = has_all_sequences
-                metrics[new_dir] = new_metrics
-
-                # Try and load the overrides
-                overrides_file = new_dir_path / ".hydra" / "overrides.yaml"
-                if overrides_file.exists():
-                    with open(str(overrides_file), "r") as stream:
-                        overrides_list = yaml.safe_load(stream)
-                        command_line = "`python run.py " + " ".join(overrides_list) + "`"
-                        new_metrics["command"] = command_line
+        has_all_sequences = len(new_metrics) == len(folder_names)
+
+        if new_metrics:
+            print(f"[INFO]Found a results directory at {new_dir}")
+            if has_all_sequences:
+                # Compute the average errors
+                tr_err_sum, num_segments, time_sum = dirs_sums[new_dir]
+                new_metrics["AVG_tr_err"] = tr_err_sum / num_segments * 100
+                new_metrics["AVG_time"] = time_sum / len(folder_names)
+            else:
+                new_metrics["AVG_tr_err"] = -1.0
+                new_metrics["AVG_time"] = -1.0
+
+            # Try to read the config to find a git_hash
+            config_path = new_dir_path / "config.yaml"
+            if config_path.exists():
+                with open(str(config_path), "r") as stream:
+                    config_dict = yaml.load(stream, Loader=_YamlLoader)
+                    if "git_hash" in config_dict:
+                        new_metrics["git_hash"] = config_dict["git_hash"]
+
+            new_metrics["has_all_sequences"] = has_all_sequences
+            metrics[new_dir] = new_metrics
+
+            # Try and load the overrides
+            overrides_file = new_dir_path / ".hydra" / "overrides.yaml"
+            if overrides_file.exists():
+                with open(str(overrides_file), "r") as stream:
+                    overrides_list = yaml.load(stream, Loader=_YamlLoader)
+                    command_line = "`python run.py " + " ".join(overrides_list) + "`"
+                    new_metrics["command"] = command_line
 
     # Build the nhcd_benchmark.md table
-    db_metrics = [(path,
-                   entry_metrics["AVG_tr_err"],
-                   entry_metrics["has_all_sequences"]) for path, entry_metrics in metrics.items()]
-    db_metrics.sort(key=lambda x: x[1] if x[2] else float("inf"))
-
-    # Build the list
-    header = [f"## {dataset_name} Benchmark:\n\n\n"]
-    main_table_lines = ["#### Sorted trajectory error on all sequences:\n",
-                        f"| **Sequence Folder**|{' | '.join(folder_names)}  |  AVG  | AVG Time (ms) |\n",
-                        "| ---: " * (len(folder_names) + 3) + "|\n"]
-
-    command_lines = ["#### Command Lines for each entry\n",
-                     f"| **Sequence Folder** | Command Line | git hash |\n",
-                     "| ---: | ---: |  ---: |\n"]
+    # Entries missing sequences are ranked last
+    paths = list(metrics.keys())
+    sort_keys = np.fromiter((entry_metrics["AVG_tr_err"] if entry_metrics["has_all_sequences"] else np.inf
+                             for entry_metrics in metrics.values()), dtype=np.float64, count=len(paths))
+    db_metrics = [(paths[idx],
+                   metrics[paths[idx]]["AVG_tr_err"],
+                   metrics[paths[idx]]["has_all_sequences"]) for idx in np.argsort(sort_keys, kind="stable")]
+
+    # Build the tables
+    main_table = io.StringIO()
+    main_table.write("#### Sorted trajectory error on all sequences:\n")
+    main_table.write(f"| **Sequence Folder**|{' | '.join(folder_names)}  |  AVG  | AVG Time (ms) |\n")
+    main_table.write("| ---: " * (len(folder_names) + 3) + "|\n")
+
+    command_table = io.StringIO()
+    command_table.write("#### Command Lines for each entry\n")
+    command_table.write(f"| **Sequence Folder** | Command Line | git hash |\n")
+    command_table.write("| ---: | ---: |  ---: |\n")
 
     for entry in db_metrics:
         path, avg, add_avg = entry
         path_id = os.path.split(path)[1]
         _metrics = metrics[path]
         avg_time = _metrics["AVG_time"]
-        columns = ' | '.join(
-            [f"{float(_metrics[seq]['tr_err']) * 100:.4f}" if seq in _metrics else '' for seq in folder_names])
+        columns = ' | '.join(f"{seq_metrics['tr_err'] * 100:.4f}" if seq_metrics is not None else ''
+                             for seq_metrics in map(_metrics.get, folder_names))
 
         path_link = f"[{path_id}]({str(Path(path).resolve())})"
-        line = f"| {path_link} | {columns} | {f'{avg:.4f}' if add_avg else ''} | {f'{avg_time:.3f}'} |\n"
-        main_table_lines.append(line)
+        main_table.write(f"| {path_link} | {columns} | {f'{avg:.4f}' if add_avg else ''} | {f'{avg_time:.3f}'} |\n")
 
-        command_lines.append(
-            f"| {path_link} |  {_metrics['command'] if 'command' in _metrics else ''}   | {_metrics['git_hash'] if 'git_hash' in _metrics else ''}|\n")
+        command_table.write(f"| {path_link} |  {_metrics.get('command', '')}   | {_metrics.get('git_hash', '')}|\n")
 
     output_file = str(output_root / f"{dataset_name}_benchmark.md")
     with open(output_file, "w") as stream:
-        stream.writelines(header)
-        stream.write("\n\n")
-        stream.writelines(main_table_lines)
-        stream.write("\n\n")
-        stream.writelines(command_lines)
+        stream.write("".join([f"## {dataset_name} Benchmark:\n\n\n",
+                              "\n\n",
+                              main_table.getvalue(),
+                              "\n\n",
+                              command_table.getvalue()]))
 
 
 if __name__ == "__main__":
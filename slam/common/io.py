@@ -54,10 +54,10 @@ def df_to_poses(df: pd.DataFrame) -> np.ndarray:
     array = df.to_numpy(dtype=np.float32)
     assert_debug(array.shape[1] == 12)
     num_rows = array.shape[0]
-    poses = array.reshape([num_rows, 3, 4])
-    last_row = np.concatenate((np.zeros((num_rows, 3)), np.ones((num_rows, 1))), axis=1)
-    last_row = np.expand_dims(last_row, axis=1)
-    poses = np.concatenate((poses, last_row), axis=1)
+    # float32 values in a float64 array (the dtype of the previous concatenation with a float64 last row)
+    poses = np.zeros((num_rows, 4, 4), dtype=np.float64)
+    poses[:, :3, :] = array.reshape([num_rows, 3, 4])
+    poses[:, 3, 3] = 1.0
 
     return poses
 
@@ -79,6 +79,7 @@ if _with_ct_icp:
         lidar_width: int = 1024
         up_fov: int = 3
         down_fov: int = -24
+        gt_dtype: str = "float32"  # The dtype of the per-frame ground truth poses `absolute_pose_gt` in the data_dict
         all_sequence: list = field(default_factory=lambda: [f"{i:02}" for i in range(11) if i != 3] +
                                                            [f"Town{1 + i:02}" for i in range(7)])
         train_sequences: list = field(default_factory=lambda: [f"{i:02}" for i in range(11) if i != 3] +
@@ -100,41 +101,54 @@ if _with_ct_icp:
         Attributes:
             options (CT_ICPDatasetOptionsWrapper): the ct_icp options to load the dataset
             sequence_id (str): id of the sequence
+            gt_dtype (str): the numpy dtype of the per-frame ground truth poses added to the data_dict
         """
 
         def __init__(self,
                      options: Union[pct.DatasetOptions, CT_ICPDatasetOptionsWrapper],
                      sequence_id: int,
                      gt_pose_channel: str = "absolute_pose_gt",
-                     numpy_pc_channel: str = "numpy_pc"):
+                     numpy_pc_channel: str = "numpy_pc",
+                     gt_dtype: str = "float32"):
             assert isinstance(options, pct.DatasetOptions) or isinstance(options, CT_ICPDatasetOptionsWrapper)
             self.options: pct.DatasetOptions = options if isinstance(options,
                                                                      pct.DatasetOptions) else options.to_pct_object()
             # assert_debug(self.options.dataset != pct.NCLT, "The NCLT Dataset is not available in Random Access")
             self.dataset_sequences = pct.get_dataset_sequence(self.options, sequence_id)
             self.sequence_id = sequence_id
-            self.gt = None
+            self._gt = None
+            self._gt_loaded = False
             self.is_initialized = False
-            if pct.has_ground_truth(self.options, sequence_id):
-                self.gt = np.array(pct.load_sensor_ground_truth(self.options, sequence_id), np.float64)
             self.numpy_pc_channel = numpy_pc_channel
             self.gt_pose_channel = gt_pose_channel
+            self.gt_dtype = gt_dtype
+
+        @property
+        def gt(self) -> Optional[np.ndarray]:
+            """The per-frame ground truth poses (in `gt_dtype`, None if not available), loaded on first access"""
+            if not self._gt_loaded:
+                if pct.has_ground_truth(self.options, self.sequence_id):
+                    self._gt = np.asarray(pct.load_sensor_ground_truth(self.options, self.sequence_id),
+                                          dtype=self.gt_dtype)
+                self._gt_loaded = True
+            return self._gt
 
         def __reduce__(self):
             # Make the dataset pickable
             return CT_ICPDatasetSequence, (CT_ICPDatasetOptionsWrapper.build_from_pct(self.options), self.sequence_id,
-                                           self.gt_pose_channel, self.numpy_pc_channel)
+                                           self.gt_pose_channel, self.numpy_pc_channel, self.gt_dtype)
 
         def process_frame(self, lidar_frame: pct.LiDARFrame, idx):
             data_dict = dict()
 
             # Add numpy pc values
             lidar_frame_ref = lidar_frame.GetStructuredArrayRef()
-            numpy_pc = lidar_frame_ref["raw_point"].copy()
+            # A single copy of the points, cast to float32 (the frame owns the memory of the structured array)
+            numpy_pc = np.ascontiguousarray(lidar_frame_ref["raw_point"], dtype=np.float32)
             timestamps = lidar_frame_ref["timestamp"].copy()
             data_dict[f"{self.numpy_pc_channel}_alpha_timestamps"] = lidar_frame_ref["alpha_timestamp"].copy()
 
-            data_dict[self.numpy_pc_channel] = numpy_pc.astype(np.float32)
+            data_dict[self.numpy_pc_channel] = numpy_pc
             data_dict[f"{self.numpy_pc_channel}_timestamps"] = timestamps
 
             if self.gt is not None:
@@ -148,8 +162,9 @@ if _with_ct_icp:
                      options: Union[pct.DatasetOptions, CT_ICPDatasetOptionsWrapper],
                      sequence_id: int,
                      gt_pose_channel: str = "absolute_pose_gt",
-                     numpy_pc_channel: str = "numpy_pc"):
-            super().__init__(options, sequence_id, gt_pose_channel, numpy_pc_channel)
+                     numpy_pc_channel: str = "numpy_pc",
+                     gt_dtype: str = "float32"):
+            super().__init__(options, sequence_id, gt_pose_channel, numpy_pc_channel, gt_dtype)
 
             assert isinstance(options, pct.DatasetOptions) or isinstance(options, CT_ICPDatasetOptionsWrapper)
             self._idx = 0
@@ -278,10 +293,11 @@ if _with_ct_icp:
             eval_sequence_ids = self.config.eval_sequences
             test_sequence_ids = self.config.test_sequences
 
-            list_seq_info = pct.get_sequences(self.options)
-            seqname_to_seqid = {seq_info.sequence_name: seq_info.sequence_id for seq_info in list_seq_info}
+            # The sequences of the dataset are listed once, in __init__
+            seqname_to_seqid = self.map_seqname_seqid
 
             _options = self.options
+            _gt_dtype = self.config.gt_dtype
 
             def __get_datasets(sequences: list):
                 if sequences is None or len(sequences) == 0:
@@ -296,8 +312,9 @@ if _with_ct_icp:
                         continue
                     seq_id = seqname_to_seqid[seq_name]
                     datasets.append(
-                        TorchCT_ICPDataset(_options, seq_id) if not self.is_iterable_dataset(_options.dataset)
-                        else IterableCT_ICPDataset(_options, seq_id))
+                        TorchCT_ICPDataset(_options, seq_id, gt_dtype=_gt_dtype)
+                        if not self.is_iterable_dataset(_options.dataset)
+                        else IterableCT_ICPDataset(_options, seq_id, gt_dtype=_gt_dtype))
                     sequence_names.append(seq_name)
 
                 return datasets, sequence_names
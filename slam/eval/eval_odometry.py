@@ -1,6 +1,7 @@
 from typing import Optional, List, Union, Tuple
 
 import matplotlib
+import numba as nb
 import numpy as np
 from pathlib import Path
 import yaml
@@ -103,64 +104,84 @@ def compute_cumulative_trajectory_length(trajectory: np.ndarray):
     return lengths
 
 
-def rotation_error(pose_err: np.ndarray):
-    _slice = []
-    if len(pose_err.shape) == 3:
-        _slice.append(slice(pose_err.shape[0]))
+KITTI_SEGMENTS = [100, 200, 300, 400, 500, 600, 700, 800]
 
-    a = pose_err[tuple(_slice + [slice(0, 1), slice(0, 1)])]
-    b = pose_err[tuple(_slice + [slice(1, 2), slice(1, 2)])]
-    c = pose_err[tuple(_slice + [slice(2, 3), slice(2, 3)])]
-    d = 0.5 * (a + b + c - 1.0)
-    error = np.arccos(np.maximum(np.minimum(d, 1.0), -1.0))
-    error = error.reshape(error.shape[0])
-    return error
 
+@nb.njit(cache=True)
+def _sequence_errors_kernel(trajectory, ground_truth, dist, first_frames, segments):
+    """
+    Computes the KITTI segment errors of a trajectory for each pair (first frame, segment length)
 
-def translation_error(pose_err: np.ndarray):
-    _slice = []
-    axis = 0
-    if len(pose_err.shape) == 3:
-        _slice.append(slice(pose_err.shape[0]))
-        axis = 1
-
-    return np.linalg.norm(pose_err[tuple(_slice + [slice(3), slice(3, 4)])], axis=axis)
+    Args:
+        trajectory (np.ndarray): The absolute poses of the trajectory `(n, 4, 4)` [np.float64]
+        ground_truth (np.ndarray): The absolute ground truth poses `(n, 4, 4)` [np.float64]
+        dist (np.ndarray): The cumulative length of the ground truth trajectory `(n,)` [np.float64]
+        first_frames (np.ndarray): The first frame of each segment `(f,)` [np.int64]
+        segments (np.ndarray): The segment lengths `(s,)` [np.float64]
 
+    Returns:
+        last_frames `(f, s)` [np.int64] (-1 if the segment is not defined), t_errs `(f, s)`, r_errs `(f, s)`
+    """
+    n_poses = ground_truth.shape[0]
+    n_first_frames = first_frames.shape[0]
+    n_segments = segments.shape[0]
+    last_frames = np.full((n_first_frames, n_segments), -1, dtype=np.int64)
+    t_errs = np.zeros((n_first_frames, n_segments), dtype=np.float64)
+    r_errs = np.zeros((n_first_frames, n_segments), dtype=np.float64)
+
+    for i in range(n_first_frames):
+        first_frame = first_frames[i]
+        inv_gt_first = np.linalg.inv(ground_truth[first_frame])
+        inv_traj_first = np.linalg.inv(trajectory[first_frame])
+        for j in range(n_segments):
+            last_frame = -1
+            for k in range(first_frame, n_poses):
+                if dist[k] > dist[first_frame] + segments[j]:
+                    last_frame = k
+                    break
+            if last_frame == -1:
+                continue
 
-def lastFrameFromSegmentLength(dist: list, first_frame: int, segment: float) -> int:
-    for i in range(first_frame, len(dist)):
-        if dist[i] > dist[first_frame] + segment:
-            return i
-    return -1
+            pose_delta_gt = inv_gt_first @ ground_truth[last_frame]
+            pose_delta_traj = inv_traj_first @ trajectory[last_frame]
+            pose_err = np.linalg.inv(pose_delta_traj) @ pose_delta_gt
 
+            d = 0.5 * (pose_err[0, 0] + pose_err[1, 1] + pose_err[2, 2] - 1.0)
+            r_errs[i, j] = np.arccos(max(min(d, 1.0), -1.0))
+            t_errs[i, j] = np.sqrt(pose_err[0, 3] ** 2 + pose_err[1, 3] ** 2 + pose_err[2, 3] ** 2)
+            last_frames[i, j] = last_frame
 
-__default_segments = [100, 200, 300, 400, 500, 600, 700, 800]
+    return last_frames, t_errs, r_errs
 
 
-def calcSequenceErrors(trajectory, ground_truth, all_segments=__default_segments, step_size: int = 10) -> list:
+def calcSequenceErrors(trajectory, ground_truth, all_segments=KITTI_SEGMENTS, step_size: int = 10) -> list:
+    trajectory = np.ascontiguousarray(trajectory, dtype=np.float64)
+    ground_truth = np.ascontiguousarray(ground_truth, dtype=np.float64)
+    # The kernel does not check the bounds of the arrays
+    check_tensor(trajectory, [-1, 4, 4])
+    check_tensor(ground_truth, [-1, 4, 4])
+    assert_debug(trajectory.shape[0] >= ground_truth.shape[0],
+                 f"The trajectory has less poses ({trajectory.shape[0]}) than the ground truth "
+                 f"({ground_truth.shape[0]})")
     dist = compute_cumulative_trajectory_length(ground_truth)
     n_poses = ground_truth.shape[0]
 
-    errors = []
-    for first_frame in range(0, n_poses, step_size):
-        for segment_len in all_segments:
-            last_frame = lastFrameFromSegmentLength(dist, first_frame, segment_len)
+    first_frames = np.arange(0, n_poses, step_size, dtype=np.int64)
+    last_frames, t_errs, r_errs = _sequence_errors_kernel(trajectory, ground_truth, dist, first_frames,
+                                                          np.asarray(all_segments, dtype=np.float64))
 
+    errors = []
+    for i, first_frame in enumerate(first_frames.tolist()):
+        for j, segment_len in enumerate(all_segments):
+            last_frame = int(last_frames[i, j])
             if last_frame == -1:
                 continue
 
-            pose_delta_gt = np.linalg.inv(ground_truth[first_frame]).dot(ground_truth[last_frame])
-            pose_delta_traj = np.linalg.inv(trajectory[first_frame]).dot(trajectory[last_frame])
-            pose_err = np.linalg.inv(pose_delta_traj).dot(pose_delta_gt)
-
-            r_err = rotation_error(pose_err)
-            t_err = translation_error(pose_err)
-
             num_frames = last_frame - first_frame + 1
             speed = segment_len / (0.1 * num_frames)
 
-            errors.append({"tr_err": t_err / segment_len,
-                           "r_err": r_err / segment_len,
+            errors.append({"tr_err": t_errs[i, j:j + 1] / segment_len,
+                           "r_err": r_errs[i, j:j + 1] / segment_len,
                            "segment": segment_len,
                            "speed": speed,
                            "first_frame": first_frame,
@@ -169,7 +190,7 @@ def calcSequenceErrors(trajectory, ground_truth, all_segments=__default_segments
     return errors
 
 
-def compute_kitti_metrics(trajectory, ground_truth, segments_sizes=__default_segments) -> tuple:
+def compute_kitti_metrics(trajectory, ground_truth, segments_sizes=KITTI_SEGMENTS) -> tuple:
     errors = calcSequenceErrors(trajectory, ground_truth, segments_sizes)
 
     if len(errors) > 0:
@@ -0,0 +1,171 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import yaml
+
+import build_benchmark_md
+from build_benchmark_md import _compute_sequence_metrics, iter_result_dirs, sequence_files
+from slam.common.io import write_poses_to_disk
+
+
+def synthetic_trajectory(num_poses: int, seed: int = 0) -> np.ndarray:
+    """A planar trajectory moving 1m per frame with a slowly varying heading"""
+    rng = np.random.default_rng(seed)
+    angles = np.cumsum(rng.normal(0.0, 0.01, num_poses))
+    poses = np.tile(np.eye(4), (num_poses, 1, 1))
+    poses[:, 0, 0] = np.cos(angles)
+    poses[:, 0, 1] = -np.sin(angles)
+    poses[:, 1, 0] = np.sin(angles)
+    poses[:, 1, 1] = np.cos(angles)
+    poses[:, 0, 3] = np.cumsum(np.cos(angles))
+    poses[:, 1, 3] = np.cumsum(np.sin(angles))
+    return poses
+
+
+class KittiMetricsCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.results_dir = os.path.join(self._tmp_dir.name, "run")
+        self.sequence_path = os.path.join(self.results_dir, "00")
+        os.makedirs(self.sequence_path)
+
+        gt_poses = synthetic_trajectory(400)
+        poses = gt_poses.copy()
+        poses[:, :3, 3] += np.random.default_rng(1).normal(0.0, 0.1, (400, 3))
+        write_poses_to_disk(os.path.join(self.sequence_path, "00_gt.poses.txt"), gt_poses)
+        write_poses_to_disk(os.path.join(self.sequence_path, "00.poses.txt"), poses)
+        with open(os.path.join(self.sequence_path, "metrics.yaml"), "w") as stream:
+            yaml.safe_dump({"00": {"nsecs_per_frame": 0.05}}, stream)
+
+        self.num_computations = 0
+        compute_kitti_metrics = build_benchmark_md.compute_kitti_metrics
+
+        def _counting_compute_kitti_metrics(*args, **kwargs):
+            self.num_computations += 1
+            return compute_kitti_metrics(*args, **kwargs)
+
+        patcher = mock.patch.object(build_benchmark_md, "compute_kitti_metrics", _counting_compute_kitti_metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def compute(self, recompute: bool = False):
+        return _compute_sequence_metrics(self.results_dir, sequence_files("00"), recompute)
+
+    def test_saved_and_reused(self):
+        metrics_file = os.path.join(self.sequence_path, "metrics.yaml")
+        with open(metrics_file, "rb") as stream:
+            metrics_content = stream.read()
+
+        new_dir, sequence_name, first = self.compute()
+        self.assertEqual((new_dir, sequence_name), (self.results_dir, "00"))
+        self.assertGreater(first["num_segments"], 0)
+        self.assertAlmostEqual(first["average_time"], 50.0)
+        self.assertTrue(os.path.isfile(os.path.join(self.sequence_path, build_benchmark_md.KITTI_METRICS_FILE)))
+
+        _, _, second = self.compute()
+        self.assertEqual(second, first)
+        self.assertEqual(self.num_computations, 1)
+
+        # The metrics of the run are never modified
+        with open(metrics_file, "rb") as stream:
+            self.assertEqual(stream.read(), metrics_content)
+
+    def test_recomputed_when_the_poses_change(self):
+        self.compute()
+
+        poses_file = os.path.join(self.sequence_path, "00.poses.txt")
+        stat = os.stat(poses_file)
+        os.utime(poses_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.compute()
+        self.assertEqual(self.num_computations, 2)
+
+    def test_recomputed_when_the_version_changes(self):
+        self.compute()
+
+        with mock.patch.object(build_benchmark_md, "KITTI_METRICS_VERSION",
+                               build_benchmark_md.KITTI_METRICS_VERSION + 1):
+            self.compute()
+            self.assertEqual(self.num_computations, 2)
+
+            # The errors are saved again with the new version
+            self.compute()
+            self.assertEqual(self.num_computations, 2)
+
+    def test_recomputed_when_the_segments_change(self):
+        self.compute()
+
+        with mock.patch.object(build_benchmark_md, "KITTI_SEGMENTS", [100, 200]):
+            self.compute()
+        self.assertEqual(self.num_computations, 2)
+
+    def test_recomputed_when_incomplete(self):
+        self.compute()
+
+        kitti_metrics_file = os.path.join(self.sequence_path, build_benchmark_md.KITTI_METRICS_FILE)
+        with open(kitti_metrics_file, "r") as stream:
+            kitti_metrics = yaml.safe_load(stream)
+        for field, value in [("num_segments", None), ("tr_err", "0.1"), ("rot_err", True)]:
+            corrupted = dict(kitti_metrics)
+            if value is None:
+                del corrupted[field]
+            else:
+                corrupted[field] = value
+            with open(kitti_metrics_file, "w") as stream:
+                yaml.safe_dump(corrupted, stream)
+            _, _, metrics = self.compute()
+            self.assertIsInstance(metrics[field], (int, float))
+        self.assertEqual(self.num_computations, 4)
+
+    def test_recomputed_on_demand(self):
+        _, _, first = self.compute()
+        _, _, second = self.compute(recompute=True)
+        self.assertEqual(self.num_computations, 2)
+        self.assertEqual(second, first)
+
+    def test_missing_poses(self):
+        os.remove(os.path.join(self.sequence_path, "00.poses.txt"))
+        self.assertEqual(self.compute(), (self.results_dir, "00", None))
+
+
+class IterResultDirsTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.root_dir = self._tmp_dir.name
+        root = self.root_dir
+
+        os.makedirs(os.path.join(root, "a", "run1", "00"))
+        # Nested below a results directory: pruned
+        os.makedirs(os.path.join(root, "a", "run1", "nested", "01"))
+        # A symlink to a sequence folder is a sequence folder
+        os.makedirs(os.path.join(root, "b", "run2"))
+        os.symlink(os.path.join(root, "a", "run1", "00"), os.path.join(root, "b", "run2", "07"))
+        # The search does not descend into symlinked directories
+        os.symlink(os.path.join(root, "a"), os.path.join(root, "c"))
+        os.makedirs(os.path.join(root, "d", "empty"))
+        # A file named after a sequence is not a sequence folder
+        os.makedirs(os.path.join(root, "e"))
+        open(os.path.join(root, "e", "00"), "w").close()
+
+        self.folder_set = frozenset(["00", "01", "07"])
+        self.expected = sorted([os.path.join(root, "a", "run1"), os.path.join(root, "b", "run2")])
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_search(self):
+        self.assertEqual(sorted(iter_result_dirs(self.root_dir, self.folder_set)), self.expected)
+
+    def test_symlinked_root(self):
+        link = os.path.join(self._tmp_dir.name, "e", "link")
+        os.symlink(os.path.join(self.root_dir, "a"), link)
+        self.assertEqual(list(iter_result_dirs(link, self.folder_set)), [os.path.join(link, "run1")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+from slam.eval.eval_odometry import calcSequenceErrors, compute_kitti_metrics, compute_cumulative_trajectory_length
+
+
+def reference_sequence_errors(trajectory, ground_truth, all_segments, step_size: int = 10) -> list:
+    """The python implementation of calcSequenceErrors replaced by the numba kernel"""
+    dist = compute_cumulative_trajectory_length(ground_truth)
+    n_poses = ground_truth.shape[0]
+
+    errors = []
+    for first_frame in range(0, n_poses, step_size):
+        for segment_len in all_segments:
+            last_frame = -1
+            for i in range(first_frame, len(dist)):
+                if dist[i] > dist[first_frame] + segment_len:
+                    last_frame = i
+                    break
+            if last_frame == -1:
+                continue
+
+            pose_delta_gt = np.linalg.inv(ground_truth[first_frame]).dot(ground_truth[last_frame])
+            pose_delta_traj = np.linalg.inv(trajectory[first_frame]).dot(trajectory[last_frame])
+            pose_err = np.linalg.inv(pose_delta_traj).dot(pose_delta_gt)
+
+            d = 0.5 * (pose_err[0:1, 0:1] + pose_err[1:2, 1:2] + pose_err[2:3, 2:3] - 1.0)
+            r_err = np.arccos(np.maximum(np.minimum(d, 1.0), -1.0)).reshape(1)
+            t_err = np.linalg.norm(pose_err[slice(3), slice(3, 4)], axis=0)
+
+            num_frames = last_frame - first_frame + 1
+            speed = segment_len / (0.1 * num_frames)
+
+            errors.append({"tr_err": t_err / segment_len,
+                           "r_err": r_err / segment_len,
+                           "segment": segment_len,
+                           "speed": speed,
+                           "first_frame": first_frame,
+                           "last_frame": last_frame})
+
+    return errors
+
+
+def synthetic_sequence(num_poses: int, seed: int = 0):
+    """Returns a noisy trajectory and its ground truth, moving about 1m per frame in 3D"""
+    rng = np.random.default_rng(seed)
+    relative_gt = np.tile(np.eye(4), (num_poses, 1, 1))
+    relative_gt[:, :3, :3] = Rotation.from_rotvec(rng.normal(0.0, 0.01, (num_poses, 3))).as_matrix()
+    relative_gt[:, :3, 3] = [1.0, 0.0, 0.0] + rng.normal(0.0, 0.05, (num_poses, 3))
+
+    relative_traj = relative_gt.copy()
+    relative_traj[:, :3, :3] = Rotation.from_rotvec(rng.normal(0.0, 0.001, (num_poses, 3))).as_matrix() @ \
+                               relative_traj[:, :3, :3]
+    relative_traj[:, :3, 3] += rng.normal(0.0, 0.01, (num_poses, 3))
+
+    ground_truth = np.zeros_like(relative_gt)
+    trajectory = np.zeros_like(relative_traj)
+    ground_truth[0] = relative_gt[0]
+    trajectory[0] = relative_traj[0]
+    for i in range(1, num_poses):
+        ground_truth[i] = ground_truth[i - 1] @ relative_gt[i]
+        trajectory[i] = trajectory[i - 1] @ relative_traj[i]
+    return trajectory, ground_truth
+
+
+class EvalOdometryTestCase(unittest.TestCase):
+    segments = [100, 200, 300, 400, 500, 600, 700, 800]
+
+    def test_sequence_errors(self):
+        trajectory, ground_truth = synthetic_sequence(1200)
+        errors = calcSequenceErrors(trajectory, ground_truth, self.segments)
+        expected = reference_sequence_errors(trajectory, ground_truth, self.segments)
+
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(len(errors), len(expected))
+        for error, expected_error in zip(errors, expected):
+            for key in ["segment", "first_frame", "last_frame"]:
+                self.assertEqual(error[key], expected_error[key])
+            self.assertAlmostEqual(error["speed"], expected_error["speed"])
+            self.assertEqual(error["tr_err"].shape, expected_error["tr_err"].shape)
+            self.assertEqual(error["r_err"].shape, expected_error["r_err"].shape)
+            np.testing.assert_allclose(error["tr_err"], expected_error["tr_err"], rtol=1e-9, atol=1e-12)
+            np.testing.assert_allclose(error["r_err"], expected_error["r_err"], rtol=1e-7, atol=1e-12)
+
+    def test_kitti_metrics(self):
+        trajectory, ground_truth = synthetic_sequence(1200, seed=1)
+        tr_err, rot_err, errors = compute_kitti_metrics(trajectory.astype(np.float32), ground_truth, self.segments)
+
+        expected = reference_sequence_errors(trajectory.astype(np.float32), ground_truth, self.segments)
+        self.assertEqual(len(errors), len(expected))
+        self.assertAlmostEqual(tr_err, sum(error["tr_err"] for error in expected)[0] / len(expected))
+        self.assertAlmostEqual(rot_err, sum(error["r_err"] for error in expected)[0] / len(expected))
+
+    def test_mismatched_shapes(self):
+        trajectory, ground_truth = synthetic_sequence(1200)
+        with self.assertRaises(AssertionError):
+            calcSequenceErrors(trajectory[:1000], ground_truth, self.segments)
+        with self.assertRaises(AssertionError):
+            compute_kitti_metrics(trajectory[:1000], ground_truth, self.segments)
+        with self.assertRaises(AssertionError):
+            calcSequenceErrors(trajectory[:, :3, :], ground_truth, self.segments)
+
+    def test_short_sequence(self):
+        trajectory, ground_truth = synthetic_sequence(50)
+        self.assertEqual(calcSequenceErrors(trajectory, ground_truth, self.segments), [])
+        self.assertEqual(compute_kitti_metrics(trajectory, ground_truth, self.segments), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()